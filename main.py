@@ -1,14 +1,23 @@
+import logging
 import os
+import sys
+from bisect import bisect_right
+from datetime import datetime, timezone
+from functools import lru_cache
 from typing import List, Optional
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, Field
 from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, TEXT, ReturnDocument, UpdateOne
 
-from database import db, create_document, get_documents
+from database import db, create_document, create_documents, get_documents
 from schemas import User, Place, Review, QuizResult
 
-app = FastAPI(title="Women Travel Safety API", version="0.1.0")
+logger = logging.getLogger(__name__)
+
+app = FastAPI(title="Women Travel Safety API", version="0.1.0", default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -19,6 +28,75 @@ app.add_middleware(
 )
 
 
+# -------------------------
+# Indexes
+# -------------------------
+
+def _place_lc_fields(doc: dict) -> dict:
+    return {"city_lc": str(doc.get("city") or "").lower(), "type_lc": str(doc.get("type") or "").lower()}
+
+
+async def setup_database():
+    # Place writes that bypass Place.model_dump() (e.g. the Flames viewer) don't set
+    # city_lc/type_lc; fill in missing ones so ?city=/?type= can find them. Lowercase in
+    # Python like Place and list_places do: $toLower only folds ASCII.
+    missing = {"$or": [{"city_lc": {"$exists": False}}, {"type_lc": {"$exists": False}}]}
+    updates = [
+        UpdateOne({"_id": d["_id"]}, {"$set": _place_lc_fields(d)})
+        async for d in db["place"].find(missing, {"city": 1, "type": 1})
+    ]
+    if updates:
+        await db["place"].bulk_write(updates, ordered=False)
+
+    # Seed rating_sum/rating_count for places that predate the running mean, so the
+    # next review averages in the existing ones instead of replacing them
+    if await db["place"].find_one({"rating_count": {"$exists": False}}, {"_id": 1}):
+        await db["review"].aggregate([
+            {"$group": {"_id": "$place_id", "rating_sum": {"$sum": "$rating"}, "rating_count": {"$sum": 1}}},
+            {"$project": {
+                "_id": {"$convert": {"input": "$_id", "to": "objectId", "onError": None, "onNull": None}},
+                "rating_sum": 1,
+                "rating_count": 1,
+                "safety_score": {"$round": [{"$divide": ["$rating_sum", "$rating_count"]}, 2]},
+            }},
+            {"$match": {"_id": {"$ne": None}}},
+            {"$merge": {
+                "into": "place",
+                "on": "_id",
+                "whenMatched": [{"$replaceWith": {"$cond": [
+                    {"$eq": [{"$type": "$rating_count"}, "missing"]},
+                    {"$mergeObjects": ["$$ROOT", "$$new"]},
+                    "$$ROOT",
+                ]}}],
+                "whenNotMatched": "discard",
+            }},
+        ]).to_list(length=None)
+        await db["place"].update_many(
+            {"rating_count": {"$exists": False}},
+            {"$set": {"rating_sum": 0, "rating_count": 0}},
+        )
+
+    await db["place"].create_index([("name", TEXT), ("description", TEXT), ("main_tags", TEXT)], background=True)
+    await db["place"].create_index([("city_lc", ASCENDING), ("type_lc", ASCENDING)], background=True)
+    await db["place"].create_index([("type_lc", ASCENDING)], background=True)
+    # equality (place_id) before sort (created_at) so list_reviews walks the index in order
+    await db["review"].create_index([("place_id", ASCENDING), ("created_at", DESCENDING)], background=True)
+    # last: fails if legacy duplicate emails exist, which shouldn't block the other indexes
+    await db["user"].create_index([("email", ASCENDING)], unique=True, background=True)
+
+
+@app.on_event("startup")
+async def ensure_indexes():
+    # The multi-worker entrypoint runs setup once before forking and sets DB_SETUP_DONE
+    if db is None or os.getenv("DB_SETUP_DONE"):
+        return
+    try:
+        await setup_database()
+    except Exception:
+        # Keep booting; database problems are reported via /test
+        logger.exception("Database setup failed")
+
+
 # -------------------------
 # Helpers
 # -------------------------
@@ -27,22 +105,39 @@ class IdModel(BaseModel):
     id: str
 
 
+_HEX = frozenset("0123456789abcdefABCDEF")
+
+
 def objid(id_str: str) -> ObjectId:
-    try:
-        return ObjectId(id_str)
-    except Exception:
+    # Reject anything that isn't 24 hex chars up front so ObjectId() can't raise
+    if len(id_str) != 24 or not _HEX.issuperset(id_str):
         raise HTTPException(status_code=400, detail="Invalid ID format")
+    return ObjectId(id_str)
+
+
+async def require_db() -> None:
+    if db is None:
+        raise HTTPException(status_code=500, detail="Database not available")
+
+
+# Path IDs are parsed once per request by these dependencies
+async def place_oid(place_id: str) -> ObjectId:
+    return objid(place_id)
+
+
+async def user_oid(user_id: str) -> ObjectId:
+    return objid(user_id)
 
 
 def serialize(doc: dict):
     if not doc:
         return doc
-    doc["id"] = str(doc.pop("_id"))
+    _id = doc.pop("_id", None)
     # Convert any nested ObjectIds just in case
-    for k, v in list(doc.items()):
-        if isinstance(v, ObjectId):
-            doc[k] = str(v)
-    return doc
+    out = {k: (str(v) if type(v) is ObjectId else v) for k, v in doc.items()}
+    if _id is not None:
+        out["id"] = str(_id)
+    return out
 
 
 # -------------------------
@@ -50,26 +145,29 @@ def serialize(doc: dict):
 # -------------------------
 
 @app.get("/")
-def root():
+async def root():
     return {"message": "Women Travel Safety API running"}
 
 
+# Minimal schema exposure for the client tools; the models are static so build it once
+_SCHEMA_RESPONSE = {
+    "collections": ["user", "place", "review", "quizresult"],
+    "models": {
+        "user": User.model_json_schema(),
+        "place": Place.model_json_schema(),
+        "review": Review.model_json_schema(),
+        "quizresult": QuizResult.model_json_schema(),
+    },
+}
+
+
 @app.get("/schema")
-def get_schema():
-    # Minimal schema exposure for the client tools
-    return {
-        "collections": ["user", "place", "review", "quizresult"],
-        "models": {
-            "user": User.model_json_schema(),
-            "place": Place.model_json_schema(),
-            "review": Review.model_json_schema(),
-            "quizresult": QuizResult.model_json_schema(),
-        },
-    }
+async def get_schema():
+    return _SCHEMA_RESPONSE
 
 
 @app.get("/test")
-def test_database():
+async def test_database():
     response = {
         "backend": "✅ Running",
         "database": "❌ Not Available",
@@ -86,7 +184,7 @@ def test_database():
             response["database_name"] = db.name if hasattr(db, 'name') else "✅ Connected"
             response["connection_status"] = "Connected"
             try:
-                collections = db.list_collection_names()
+                collections = await db.list_collection_names()
                 response["collections"] = collections[:10]
                 response["database"] = "✅ Connected & Working"
             except Exception as e:
@@ -107,12 +205,10 @@ def test_database():
 # -------------------------
 
 @app.post("/seed")
-def seed_sample():
-    if db is None:
-        raise HTTPException(status_code=500, detail="Database not available")
-
+async def seed_sample(_: None = Depends(require_db)):
+    # Trusted literals: model_construct skips re-running validators on data we wrote ourselves
     samples = [
-        Place(
+        Place.model_construct(
             name="Aurora Boutique Hotel",
             city="Lisbon",
             type="hotel",
@@ -120,7 +216,7 @@ def seed_sample():
             description="Women-staffed, well-lit area; guests report safe returns at night.",
             main_tags=["women-staffed", "well-lit", "central"]
         ),
-        Place(
+        Place.model_construct(
             name="Garden District",
             city="Singapore",
             type="neighborhood",
@@ -128,7 +224,7 @@ def seed_sample():
             description="Exceptionally safe at night; strong street presence and cameras.",
             main_tags=["night-safe", "family-friendly", "clean"]
         ),
-        Place(
+        Place.model_construct(
             name="Olive & Thyme",
             city="Barcelona",
             type="restaurant",
@@ -138,35 +234,103 @@ def seed_sample():
         ),
     ]
 
-    ids = []
-    for p in samples:
-        ids.append(create_document("place", p))
-    return {"inserted": ids}
+    return {"inserted": await create_documents("place", samples)}
 
 
 # -------------------------
 # Places Directory
 # -------------------------
 
-@app.get("/places")
-def list_places(city: Optional[str] = None, type: Optional[str] = None, q: Optional[str] = None):
-    if db is None:
-        raise HTTPException(status_code=500, detail="Database not available")
+# Server-side projections return JSON-ready docs (string id, no _id) so list
+# endpoints can skip serialize(); the place list carries only card fields
+_PLACE_LIST_PROJECTION = {
+    "_id": 0,
+    "id": {"$toString": "$_id"},
+    "name": 1,
+    "city": 1,
+    "type": 1,
+    "safety_score": 1,
+    "main_tags": 1,
+}
+
+_REVIEW_PROJECTION = {
+    "_id": 0,
+    "id": {"$toString": "$_id"},
+    "user_id": 1,
+    "place_id": 1,
+    "rating": 1,
+    "safety_tags": 1,
+    "comment": 1,
+    "night_safe": 1,
+    "harassment": 1,
+    "created_at": 1,
+}
+
+
+def _intern(v):
+    return sys.intern(v) if type(v) is str else v
+
+
+def _intern_place(doc: dict) -> dict:
+    # city/type/tags repeat across many places; share one str object per distinct value.
+    # Fields may be missing or non-str on legacy docs, so leave those as they are.
+    for k in ("city", "type"):
+        if k in doc:
+            doc[k] = _intern(doc[k])
+    tags = doc.get("main_tags")
+    if isinstance(tags, list):
+        doc["main_tags"] = [_intern(t) for t in tags]
+    return doc
 
+
+@app.get("/places")
+async def list_places(
+    city: Optional[str] = None,
+    type: Optional[str] = None,
+    q: Optional[str] = Query(None, max_length=64),
+    _: None = Depends(require_db),
+):
+    # Equality on the lowercased fields and $text on the text index keep these queries indexed
     filt = {}
     if city:
-        filt["city"] = {"$regex": f"^{city}$", "$options": "i"}
+        filt["city_lc"] = city.lower()
     if type:
-        filt["type"] = {"$regex": f"^{type}$", "$options": "i"}
-    if q:
-        filt["$or"] = [
-            {"name": {"$regex": q, "$options": "i"}},
-            {"description": {"$regex": q, "$options": "i"}},
-            {"main_tags": {"$elemMatch": {"$regex": q, "$options": "i"}}},
-        ]
-
-    docs = get_documents("place", filt, None)
-    return [serialize(d) for d in docs]
+        filt["type_lc"] = type.lower()
+    # q only ever reaches $text (no user input is compiled as a regex); blank queries are ignored
+    if q and q.strip():
+        filt["$text"] = {"$search": q}
+
+    docs = await get_documents("place", filt, None, projection=_PLACE_LIST_PROJECTION)
+    for d in docs:
+        _intern_place(d)
+    return docs
+
+
+# Reviews store place_id as a string, so join on a stringified _id. The sub-pipeline
+# folds each place's reviews to one stats doc server-side (needs MongoDB 5.0+).
+_PLACE_STATS_PIPELINE = [
+    {"$addFields": {"pid": {"$toString": "$_id"}}},
+    {"$lookup": {
+        "from": "review",
+        "localField": "pid",
+        "foreignField": "place_id",
+        "as": "rs",
+        "pipeline": [{"$group": {"_id": None, "avg": {"$avg": "$rating"}, "n": {"$sum": 1}}}],
+    }},
+    {"$project": {
+        "_id": 0,
+        "id": "$pid",
+        "name": 1,
+        "city": 1,
+        "avg": {"$first": "$rs.avg"},
+        "n": {"$ifNull": [{"$first": "$rs.n"}, 0]},
+    }},
+]
+
+
+@app.get("/places/stats")
+async def place_stats(_: None = Depends(require_db)):
+    return await db["place"].aggregate(_PLACE_STATS_PIPELINE).to_list(length=None)
 
 
 class NewReview(BaseModel):
@@ -179,42 +343,58 @@ class NewReview(BaseModel):
 
 
 @app.post("/places/{place_id}/reviews")
-def add_review(place_id: str, payload: NewReview):
-    if db is None:
-        raise HTTPException(status_code=500, detail="Database not available")
-
+async def add_review(
+    payload: NewReview,
+    _: None = Depends(require_db),
+    place_id: ObjectId = Depends(place_oid),
+):
     # ensure place exists
-    place = db["place"].find_one({"_id": objid(place_id)})
+    place = await db["place"].find_one({"_id": place_id}, {"_id": 1})
     if not place:
         raise HTTPException(status_code=404, detail="Place not found")
 
-    review = Review(
+    # payload was already validated by FastAPI; build the stored model without validating it again
+    review = Review.model_construct(
         user_id=payload.user_id,
-        place_id=place_id,
+        place_id=str(place_id),
         rating=payload.rating,
         safety_tags=payload.safety_tags,
         comment=payload.comment,
         night_safe=payload.night_safe,
         harassment=payload.harassment,
     )
-    rid = create_document("review", review)
-
-    # naive safety score update (average of ratings)
-    ratings = [r.get("rating", 0) for r in db["review"].find({"place_id": place_id})]
-    if ratings:
-        avg = sum(ratings) / len(ratings)
-        db["place"].update_one({"_id": objid(place_id)}, {"$set": {"safety_score": round(avg, 2)}})
+    rid = await create_document("review", review)
+
+    # running average: bump rating_sum/rating_count and derive safety_score in one update
+    await db["place"].update_one(
+        {"_id": place_id},
+        [
+            {"$set": {
+                "rating_sum": {"$add": [{"$ifNull": ["$rating_sum", 0]}, payload.rating]},
+                "rating_count": {"$add": [{"$ifNull": ["$rating_count", 0]}, 1]},
+            }},
+            {"$set": {"safety_score": {"$round": [{"$divide": ["$rating_sum", "$rating_count"]}, 2]}}},
+        ],
+    )
 
     return {"id": rid}
 
 
 @app.get("/places/{place_id}/reviews")
-def list_reviews(place_id: str):
-    if db is None:
-        raise HTTPException(status_code=500, detail="Database not available")
-
-    docs = list(db["review"].find({"place_id": place_id}).sort("created_at", -1))
-    return [serialize(d) for d in docs]
+async def list_reviews(
+    limit: int = Query(50, ge=1, le=200),
+    skip: int = Query(0, ge=0),
+    _: None = Depends(require_db),
+    place_id: ObjectId = Depends(place_oid),
+):
+    # Page over the (place_id, created_at) index; pages are bounded so fetch them whole
+    cursor = (
+        db["review"].find({"place_id": str(place_id)}, _REVIEW_PROJECTION)
+        .sort("created_at", -1)
+        .skip(skip)
+        .limit(limit)
+    )
+    return await cursor.to_list(length=limit)
 
 
 # -------------------------
@@ -229,33 +409,47 @@ class QuizAnswer(BaseModel):
     transport_confidence: str
 
 
+_COMFORT = {"high": 2, "medium": 1}
+_SOLO = {"5+": 2, "2-4": 1}
+_NIGHT = {"comfortable": 2}
+_TRANSPORT = {"metro": 1, "ride-share": 1}
+
+# Persona tiers keyed by score thresholds: <4, 4-5, 6+
+_PERSONA_THRESHOLDS = [4, 6]
+_PERSONAS = (
+    ("Cautious Explorer", ("Reykjavik", "Zurich", "Taipei")),
+    ("Planner", ("Tokyo", "Vienna", "Seoul")),
+    ("Trailblazer", ("Singapore", "Lisbon", "Copenhagen")),
+)
+
+
+@lru_cache(maxsize=2048)
+def _score(comfort: str, solo: str, night: str, crowds: bool, transport: str):
+    # Simple scoring heuristic for MVP; pure in its inputs so repeated answer sets hit the cache
+    score = (
+        _COMFORT.get(comfort, 0)
+        + _SOLO.get(solo, 0)
+        + _NIGHT.get(night, 0)
+        + (not crowds)
+        + _TRANSPORT.get(transport, 0)
+    )
+    return _PERSONAS[bisect_right(_PERSONA_THRESHOLDS, score)]
+
+
 @app.post("/quiz")
-def evaluate_quiz(ans: QuizAnswer, user_id: Optional[str] = None):
-    # Simple scoring heuristic for MVP
-    score = 0
-    if ans.comfort_level in ["high", "medium"]:
-        score += 2 if ans.comfort_level == "high" else 1
-    if ans.solo_experience in ["5+", "2-4"]:
-        score += 2 if ans.solo_experience == "5+" else 1
-    if ans.night_travel == "comfortable":
-        score += 2
-    if "crowds" not in ans.anxiety_triggers:
-        score += 1
-    if ans.transport_confidence in ["metro", "ride-share"]:
-        score += 1
-
-    if score >= 6:
-        persona = "Trailblazer"
-        recs = ["Singapore", "Lisbon", "Copenhagen"]
-    elif score >= 4:
-        persona = "Planner"
-        recs = ["Tokyo", "Vienna", "Seoul"]
-    else:
-        persona = "Cautious Explorer"
-        recs = ["Reykjavik", "Zurich", "Taipei"]
-
-    result = QuizResult(user_id=user_id, persona=persona, recommendations=recs, answers=ans.model_dump())
-    rid = create_document("quizresult", result)
+async def evaluate_quiz(ans: QuizAnswer, user_id: Optional[str] = None, _: None = Depends(require_db)):
+    persona, recs = _score(
+        ans.comfort_level,
+        ans.solo_experience,
+        ans.night_travel,
+        "crowds" in ans.anxiety_triggers,
+        ans.transport_confidence,
+    )
+    recs = list(recs)
+
+    # answers were validated on entry; skip a second validation pass for the stored result
+    result = QuizResult.model_construct(user_id=user_id, persona=persona, recommendations=recs, answers=ans.model_dump())
+    rid = await create_document("quizresult", result)
 
     return {"id": rid, "persona": persona, "recommendations": recs}
 
@@ -271,16 +465,22 @@ class Signup(BaseModel):
 
 
 @app.post("/auth/signup")
-def signup(payload: Signup):
-    if db is None:
-        raise HTTPException(status_code=500, detail="Database not available")
-
-    existing = db["user"].find_one({"email": payload.email})
-    if existing:
-        return serialize(existing)
-
-    uid = create_document("user", {"name": payload.name, "email": payload.email, "photo": payload.photo, "saved_places": [], "saved_cities": []})
-    doc = db["user"].find_one({"_id": objid(uid)})
+async def signup(payload: Signup, _: None = Depends(require_db)):
+    # Return the existing user or insert a new one in a single round trip
+    now = datetime.now(timezone.utc)
+    doc = await db["user"].find_one_and_update(
+        {"email": payload.email},
+        {"$setOnInsert": {
+            "name": payload.name,
+            "photo": payload.photo,
+            "saved_places": [],
+            "saved_cities": [],
+            "created_at": now,
+            "updated_at": now,
+        }},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
     return serialize(doc)
 
 
@@ -289,21 +489,22 @@ class SavePlace(BaseModel):
 
 
 @app.post("/me/{user_id}/save")
-def save_place(user_id: str, payload: SavePlace):
-    if db is None:
-        raise HTTPException(status_code=500, detail="Database not available")
-
-    db["user"].update_one({"_id": objid(user_id)}, {"$addToSet": {"saved_places": payload.place_id}})
-    doc = db["user"].find_one({"_id": objid(user_id)})
+async def save_place(
+    payload: SavePlace,
+    _: None = Depends(require_db),
+    user_id: ObjectId = Depends(user_oid),
+):
+    doc = await db["user"].find_one_and_update(
+        {"_id": user_id},
+        {"$addToSet": {"saved_places": payload.place_id}},
+        return_document=ReturnDocument.AFTER,
+    )
     return serialize(doc)
 
 
 @app.get("/me/{user_id}")
-def profile(user_id: str):
-    if db is None:
-        raise HTTPException(status_code=500, detail="Database not available")
-
-    doc = db["user"].find_one({"_id": objid(user_id)})
+async def profile(_: None = Depends(require_db), user_id: ObjectId = Depends(user_oid)):
+    doc = await db["user"].find_one({"_id": user_id})
     if not doc:
         raise HTTPException(status_code=404, detail="User not found")
     return serialize(doc)
@@ -312,4 +513,10 @@ def profile(user_id: str):
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    workers = int(os.getenv("WEB_CONCURRENCY") or os.cpu_count() or 1)
+    if workers > 1:
+        # Backfills and index builds run here once instead of in every worker
+        import asyncio
+        asyncio.run(ensure_indexes())
+        os.environ["DB_SETUP_DONE"] = "1"
+    uvicorn.run("main:app", host="0.0.0.0", port=port, workers=workers, loop="uvloop", http="httptools")
@@ -3,9 +3,12 @@ Database Schemas for Women’s Travel Safety Platform (MVP)
 
 Each Pydantic model represents a MongoDB collection. The collection name
 is the lowercase of the class name (e.g., User -> "user").
+
+These models are not validated on any request path; request bodies are
+validated by pydantic-core (compiled) through the route models in main.py.
 """
 from typing import List, Optional
-from pydantic import BaseModel, Field, EmailStr
+from pydantic import BaseModel, Field, EmailStr, computed_field
 
 # -------------------------
 # Core Collections
@@ -32,6 +35,21 @@ class Place(BaseModel):
     safety_score: float = Field(3.5, ge=0, le=5, description="Safety score 0-5")
     description: str = Field(..., description="Short 150-character safety description")
     main_tags: List[str] = Field(default_factory=list, description="Key safety tags")
+    rating_sum: int = Field(0, ge=0, description="Sum of review ratings")
+    rating_count: int = Field(0, ge=0, description="Number of review ratings")
+
+    # city_lc/type_lc are stored for indexed ?city=/?type= filters. They are not part of
+    # the validation JSON schema, so other writers must set them (lowercased city/type);
+    # the API fills in missing values on startup but does not correct stale ones.
+    @computed_field(description="Lowercased city for indexed equality lookups")
+    @property
+    def city_lc(self) -> str:
+        return self.city.lower()
+
+    @computed_field(description="Lowercased type for indexed equality lookups")
+    @property
+    def type_lc(self) -> str:
+        return self.type.lower()
 
 
 class Review(BaseModel):
@@ -0,0 +1,63 @@
+from fastapi.testclient import TestClient
+
+import main
+
+client = TestClient(main.app)
+
+
+def test_root():
+    res = client.get("/")
+    assert res.status_code == 200
+    assert res.json() == {"message": "Women Travel Safety API running"}
+
+
+def test_schema():
+    res = client.get("/schema")
+    assert res.status_code == 200
+    assert set(res.json()["models"]) == {"user", "place", "review", "quizresult"}
+
+
+def test_db_unavailable(monkeypatch):
+    monkeypatch.setattr(main, "db", None)
+    assert client.get("/places").status_code == 500
+    assert client.get("/places/not-an-id/reviews").status_code == 500
+
+
+def test_invalid_id(monkeypatch):
+    monkeypatch.setattr(main, "db", object())
+    res = client.get("/me/not-an-id")
+    assert res.status_code == 400
+    assert res.json() == {"detail": "Invalid ID format"}
+    assert client.get("/places/zzzzzzzzzzzzzzzzzzzzzzzz/reviews").status_code == 400
+
+
+def test_startup_survives_db_errors(monkeypatch):
+    class BrokenDb:
+        def __getitem__(self, name):
+            raise RuntimeError("unreachable")
+
+    monkeypatch.setattr(main, "db", BrokenDb())
+    with TestClient(main.app) as c:
+        assert c.get("/").status_code == 200
+
+
+def test_non_ascii_city_lowercasing(monkeypatch):
+    calls = []
+
+    async def fake_get_documents(collection_name, filter_dict=None, limit=None, projection=None):
+        calls.append(filter_dict)
+        return []
+
+    monkeypatch.setattr(main, "db", object())
+    monkeypatch.setattr(main, "get_documents", fake_get_documents)
+
+    place = main.Place.model_construct(name="Praça", city="Évora", type="Hotel", description="")
+    stored = place.model_dump()
+    assert main._place_lc_fields({"city": "Évora", "type": "Hotel"}) == {
+        "city_lc": stored["city_lc"],
+        "type_lc": stored["type_lc"],
+    }
+
+    assert client.get("/places", params={"city": "ÉVORA", "type": "HOTEL"}).status_code == 200
+    assert calls[0]["city_lc"] == stored["city_lc"] == "évora"
+    assert calls[0]["type_lc"] == stored["type_lc"] == "hotel"